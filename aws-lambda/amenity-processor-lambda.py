@@ -18,6 +18,35 @@ import base64
 import urllib.parse
 from pymongo import MongoClient
 from bson import ObjectId
+from bedrock_request import invoke_claude, get_max_tokens
+
+# Stage name for usage tracking and its hand-set max_tokens ceiling
+STAGE = "amenities"
+DEFAULT_MAX_TOKENS = 300
+
+# Static instructions, sent as the system block ahead of the image
+AMENITY_PROMPT = """Analyze this hotel image and return ONLY a comma-separated list of these standardized amenity names
+that you can visibly identify in the image:
+
+General Amenities (hotel-wide):
+- 24-hour-front-desk
+- free-parking
+- swimming-pool
+- fitness-center
+- spa-services
+
+Room Amenities:
+- free-wi-fi
+- air-conditioning
+- flat-screen-tv
+- complimentary-toiletries
+- towels
+- hairdryer
+- mini-fridge
+- coffee/tea-maker
+- daily-housekeeping
+
+Example response: free-wi-fi,air-conditioning,swimming-pool"""
 
 
 def lambda_handler(event, context):
@@ -47,6 +76,7 @@ def lambda_handler(event, context):
     # Process each image one by one and collect unique amenities
     all_amenities = set()
     max_amenities = 10
+    max_tokens = get_max_tokens(db, STAGE, DEFAULT_MAX_TOKENS)
     
     for img in hotel_images:
         # Stop if we've already found 10 unique amenities
@@ -62,8 +92,14 @@ def lambda_handler(event, context):
             media_type = get_media_type(img['image_url'])
             
             # Process single image with Claude
-            image_amenities = get_amenities_from_bedrock(bedrock, encoded_image, media_type)
+            image_amenities = get_amenities_from_bedrock(bedrock, db, encoded_image, media_type, max_tokens)
             
+            # Keep per-image analysis on the image document
+            db.hotel_images.update_one(
+                {"_id": img['_id']},
+                {"$set": {"amenities": image_amenities}}
+            )
+
             # Add unique amenities to our set
             all_amenities.update(image_amenities)
             
@@ -87,18 +123,8 @@ def lambda_handler(event, context):
 
         # First check if this is a general amenity (not room-specific)
         if is_general_amenity(amenity_lower):
-            # Create record without room_id for general amenities
-            if not db.hotel_amenities.find_one({
-                "hotel_id": hotel_id,
-                "amenity_name": amenity_lower,
-                "room_id": {"$exists": False}
-            }):
-                db.hotel_amenities.insert_one({
-                    "hotel_id": hotel_id,
-                    "amenity_id": str(ObjectId()),
-                    "amenity_name": amenity_lower,
-                    "room_id": ""  # Explicit empty string
-                })
+            # Create record with empty room_id for general amenities
+            upsert_amenity(db, hotel_id, "", amenity_lower)
             continue
 
         # For room-specific amenities
@@ -106,20 +132,8 @@ def lambda_handler(event, context):
             room_id = room['room_id'] if room else ""
             room_type = room['room_type'] if room else ""
 
-            # Check if this combination exists
-            exists = db.hotel_amenities.find_one({
-                "hotel_id": hotel_id,
-                "room_id": room_id,
-                "amenity_name": amenity_lower
-            })
-
-            if not exists and should_associate_amenity(amenity_lower, room_type):
-                db.hotel_amenities.insert_one({
-                    "hotel_id": hotel_id,
-                    "room_id": room_id,  # Will be empty string if no room
-                    "amenity_id": str(ObjectId()),
-                    "amenity_name": amenity_lower
-                })
+            if should_associate_amenity(amenity_lower, room_type):
+                upsert_amenity(db, hotel_id, room_id, amenity_lower)
 
     # Dispatch SNS Topic to Trigger next Lambda
     sns = boto3.client('sns')
@@ -131,6 +145,19 @@ def lambda_handler(event, context):
     )
 
 
+def upsert_amenity(db, hotel_id, room_id, amenity_name):
+    """Insert amenity once per (hotel_id, room_id, amenity_name)"""
+    db.hotel_amenities.update_one(
+        {
+            "hotel_id": hotel_id,
+            "room_id": room_id,  # Empty string for general amenities or when no room
+            "amenity_name": amenity_name
+        },
+        {"$setOnInsert": {"amenity_id": str(ObjectId())}},
+        upsert=True
+    )
+
+
 def is_general_amenity(amenity):
     """Check if amenity applies to the whole hotel (not room-specific)"""
     general_amenities = {
@@ -167,57 +194,11 @@ def should_associate_amenity(amenity, room_type):
     return False
 
 
-def get_amenities_from_bedrock(bedrock, encoded_image, media_type):
+def get_amenities_from_bedrock(bedrock, db, encoded_image, media_type, max_tokens):
     """Extract amenities using Claude 3 for a single image"""
-    prompt = """Analyze this hotel image and return ONLY a comma-separated list of these standardized amenity names 
-    that you can visibly identify in the image:
-
-    General Amenities (hotel-wide):
-    - 24-hour-front-desk
-    - free-parking
-    - swimming-pool
-    - fitness-center
-    - spa-services
-
-    Room Amenities:
-    - free-wi-fi
-    - air-conditioning
-    - flat-screen-tv
-    - complimentary-toiletries
-    - towels
-    - hairdryer
-    - mini-fridge
-    - coffee/tea-maker
-    - daily-housekeeping
-
-    Example response: free-wi-fi,air-conditioning,swimming-pool"""
-
-    # Create message with single image
-    message_content = [
-        {
-            "type": "image",
-            "source": {
-                "type": "base64",
-                "media_type": media_type,
-                "data": encoded_image
-            }
-        },
-        {"type": "text", "text": prompt}
-    ]
-
-    response = bedrock.invoke_model(
-        modelId="anthropic.claude-3-sonnet-20240229-v1:0",
-        body=json.dumps({
-            "anthropic_version": "bedrock-2023-05-31",
-            "messages": [{
-                "role": "user",
-                "content": message_content
-            }],
-            "max_tokens": 300
-        })
-    )
-
-    result = json.loads(response['body'].read())['content'][0]['text']
+    response_body = invoke_claude(bedrock, db, STAGE, AMENITY_PROMPT, media_type, encoded_image,
+                                  max_tokens, DEFAULT_MAX_TOKENS)
+    result = response_body['content'][0]['text']
     return list(set(a.strip().lower() for a in result.split(',') if a.strip()))
 
 
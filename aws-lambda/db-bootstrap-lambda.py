@@ -0,0 +1,210 @@
+"""
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import json
+from datetime import datetime
+from pymongo import MongoClient, ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import CollectionInvalid
+
+# Bedrock usage rows older than this are expired by the TTL index (max_tokens only reads the newest 500 per stage)
+USAGE_TTL_SECONDS = 30 * 24 * 60 * 60
+
+# Index definitions per collection: (keys, options)
+INDEXES = {
+    'hotel_images': [
+        ([('hotel_id', ASCENDING), ('image_id', ASCENDING)], {'name': 'hotel_image_uq', 'unique': True}),
+        ([('hotel_id', ASCENDING), ('category', ASCENDING)], {'name': 'hotel_category'})
+    ],
+    'hotel_rooms': [
+        ([('hotel_id', ASCENDING), ('room_id', ASCENDING), ('room_type', ASCENDING)],
+         {'name': 'hotel_room_type_uq', 'unique': True})
+    ],
+    'hotel_amenities': [
+        ([('hotel_id', ASCENDING), ('room_id', ASCENDING), ('amenity_name', ASCENDING)],
+         {'name': 'hotel_room_amenity_uq', 'unique': True})
+    ],
+    'hotels': [
+        ([('hotel_id', ASCENDING)], {'name': 'hotel_uq', 'unique': True})
+    ],
+    'bedrock_usage': [
+        ([('stage', ASCENDING), ('_id', DESCENDING)], {'name': 'stage_recent'}),
+        ([('created_at', ASCENDING)], {'name': 'created_ttl', 'expireAfterSeconds': USAGE_TTL_SECONDS})
+    ]
+}
+
+# Indexes created by earlier bootstraps that no query uses any more
+OBSOLETE_INDEXES = {
+    'hotel_images': ['hotel_room']
+}
+
+# Consolidated image document: one per (hotel_id, image_id)
+IMAGE_SCHEMA = {
+    '$jsonSchema': {
+        'bsonType': 'object',
+        'required': ['hotel_id', 'image_id', 'image_url'],
+        'properties': {
+            'hotel_id': {'bsonType': 'string'},
+            'image_id': {'bsonType': 'string'},
+            'image_url': {'bsonType': 'string'},
+            'category': {'bsonType': 'string'},
+            'room_id': {'bsonType': 'string'},
+            'rating': {'bsonType': ['int', 'long', 'double']},
+            'amenities': {'bsonType': 'array', 'items': {'bsonType': 'string'}}
+        }
+    }
+}
+
+# Queries the pipeline depends on; none of them may fall back to a COLLSCAN
+PIPELINE_QUERIES = [
+    ('hotel_images', {'hotel_id': ''}),
+    ('hotel_images', {'hotel_id': '', 'image_id': ''}),
+    ('hotel_images', {'hotel_id': '', 'category': 'rooms'}),
+    ('hotel_rooms', {'hotel_id': ''}),
+    ('hotel_amenities', {'hotel_id': '', 'room_id': '', 'amenity_name': ''}),
+    ('hotels', {'hotel_id': ''}),
+    ('bedrock_usage', {'stage': ''})
+]
+
+
+def lambda_handler(event, context):
+    mongo_client = MongoClient('mongodb://3.91.45.234:27017/')
+    db = mongo_client['hotel_db']
+
+    apply_image_schema(db)
+    migrated = migrate_image_documents(db)
+    removed = remove_duplicates(db)
+    backfill_usage_timestamps(db)
+    ensure_indexes(db)
+    verify_query_plans(db)
+
+    return {
+        "statusCode": 200,
+        "body": json.dumps({
+            "migrated_images": migrated,
+            "removed_duplicates": removed,
+            "message": "Indexes and schema are up to date"
+        })
+    }
+
+
+def apply_image_schema(db):
+    """Create hotel_images with its validator, or update the validator if it already exists"""
+    try:
+        db.create_collection('hotel_images', validator=IMAGE_SCHEMA, validationLevel='moderate')
+    except CollectionInvalid:
+        db.command('collMod', 'hotel_images', validator=IMAGE_SCHEMA, validationLevel='moderate')
+
+
+def migrate_image_documents(db):
+    """Fold category (hotel_context) and room_id (hotel_rooms) into the image documents"""
+    # Newest rows first, keeping only the first (latest) value per image
+    categories = {}
+    contexts = db.hotel_context.find({}, {'_id': 0, 'hotel_id': 1, 'image_id': 1, 'category': 1})
+    for ctx in contexts.sort('_id', DESCENDING):
+        categories.setdefault((ctx['hotel_id'], ctx['image_id']), ctx['category'])
+
+    room_ids = {}
+    rooms = db.hotel_rooms.find({}, {'_id': 0, 'hotel_id': 1, 'image_id': 1, 'room_id': 1})
+    for room in rooms.sort('_id', DESCENDING):
+        if room.get('image_id'):
+            room_ids.setdefault((room['hotel_id'], room['image_id']), room['room_id'])
+
+    updates = [
+        UpdateOne(
+            {'hotel_id': hotel_id, 'image_id': image_id, field: {'$exists': False}},
+            {'$set': {field: value}}
+        )
+        for field, values in (('category', categories), ('room_id', room_ids))
+        for (hotel_id, image_id), value in values.items()
+    ]
+
+    if not updates:
+        return 0
+    return db.hotel_images.bulk_write(updates, ordered=False).modified_count
+
+
+def remove_duplicates(db):
+    """Merge duplicate documents on each unique key so the unique indexes can be built"""
+    removed = 0
+
+    for collection, indexes in INDEXES.items():
+        for keys, options in indexes:
+            if not options.get('unique'):
+                continue
+
+            group_id = {field: f'${field}' for field, _ in keys}
+            duplicates = db[collection].aggregate([
+                {'$group': {'_id': group_id, 'ids': {'$push': '$_id'}, 'count': {'$sum': 1}}},
+                {'$match': {'count': {'$gt': 1}}}
+            ], allowDiskUse=True)
+
+            for dup in duplicates:
+                docs = list(db[collection].find({'_id': {'$in': dup['ids']}}).sort('_id', ASCENDING))
+                keep = docs[0]
+
+                # Later documents carry the most recent analysis, so their fields win
+                merged = {}
+                for doc in docs:
+                    merged.update({k: v for k, v in doc.items() if k != '_id'})
+
+                db[collection].replace_one({'_id': keep['_id']}, merged)
+                extra_ids = [doc['_id'] for doc in docs[1:]]
+                removed += db[collection].delete_many({'_id': {'$in': extra_ids}}).deleted_count
+
+    return removed
+
+
+def backfill_usage_timestamps(db):
+    """Stamp usage rows written before created_at existed so the TTL index can expire them"""
+    db.bedrock_usage.update_many(
+        {'created_at': {'$exists': False}},
+        {'$set': {'created_at': datetime.utcnow()}}
+    )
+
+
+def ensure_indexes(db):
+    """Create all indexes (create_index is a no-op when the index already exists) and drop obsolete ones"""
+    for collection, names in OBSOLETE_INDEXES.items():
+        existing = db[collection].index_information()
+        for name in names:
+            if name in existing:
+                db[collection].drop_index(name)
+
+    for collection, indexes in INDEXES.items():
+        for keys, options in indexes:
+            db[collection].create_index(keys, **options)
+
+
+def verify_query_plans(db):
+    """Raise if any pipeline query's winning plan contains a COLLSCAN stage"""
+    for collection, query in PIPELINE_QUERIES:
+        plan = db[collection].find(query).explain()['queryPlanner']['winningPlan']
+        stages = collect_stages(plan)
+        if 'COLLSCAN' in stages:
+            raise RuntimeError(f"Query on {collection} {sorted(query)} uses a collection scan: {stages}")
+        print(f"{collection} {sorted(query)} -> {stages}")
+
+
+def collect_stages(plan):
+    """Collect every stage name from an explain plan tree"""
+    stages = []
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            stages.append(plan['stage'])
+        for value in plan.values():
+            stages.extend(collect_stages(value))
+    elif isinstance(plan, list):
+        for item in plan:
+            stages.extend(collect_stages(item))
+    return stages
@@ -17,6 +17,23 @@ import json
 import base64
 from pymongo import MongoClient
 from bson import ObjectId
+from bedrock_request import invoke_claude, get_max_tokens
+
+# Stage name for usage tracking and its hand-set max_tokens ceiling
+STAGE = "hotel_category"
+DEFAULT_MAX_TOKENS = 100
+
+# Static instructions, sent as the system block ahead of the image
+CATEGORY_PROMPT = """Categorize image strictly into ONE of these categories:
+- exterior
+- interior
+- foods
+- leisure
+- parking
+- rooms
+- bathrooms
+
+Return ONLY the category name (no quotes or explanations)."""
 
 
 def lambda_handler(event, context):
@@ -25,6 +42,8 @@ def lambda_handler(event, context):
     mongo_client = MongoClient('mongodb://3.91.45.234:27017/')
     db = mongo_client['hotel_db']
 
+    max_tokens = get_max_tokens(db, STAGE, DEFAULT_MAX_TOKENS)
+
     processed_hotel_ids = set()  # Track hotels we've processed in this invocation
 
     hotel_id = ''
@@ -49,27 +68,17 @@ def lambda_handler(event, context):
             continue
 
         # Categorize image with Claude 3
-        category = categorize_image(bedrock, bucket, key)
-
-        # Check for existing category entry
-        existing_context = db.hotel_context.find_one({
-            "hotel_id": hotel_id,
-            "image_id": image_id,
-            "category": category
-        })
-
-        if not existing_context:
-            # Insert records only if they don't exist
-            db.hotel_images.insert_one({
-                "hotel_id": hotel_id,
-                "image_id": image_id,
-                "image_url": image_url
-            })
-            db.hotel_context.insert_one({
-                "hotel_id": hotel_id,
-                "image_id": image_id,
+        category = categorize_image(bedrock, db, bucket, key, max_tokens)
+
+        # Store category on the image document (one document per hotel_id + image_id)
+        db.hotel_images.update_one(
+            {"hotel_id": hotel_id, "image_id": image_id},
+            {"$set": {
+                "image_url": image_url,
                 "category": category
-            })
+            }},
+            upsert=True
+        )
 
         # Track processed hotels for SNS notification
         processed_hotel_ids.add(hotel_id)
@@ -79,10 +88,10 @@ def lambda_handler(event, context):
     for hotel_id in processed_hotel_ids:
         # Get only new room images that were just processed
         new_room_images = [
-            img["image_id"] for img in db.hotel_context.find({
+            img["image_id"] for img in db.hotel_images.find({
                 "hotel_id": hotel_id,
                 "category": "rooms"
-            })
+            }, {"_id": 0, "image_id": 1})
         ]
 
         if new_room_images:
@@ -95,37 +104,11 @@ def lambda_handler(event, context):
             )
 
 
-def categorize_image(bedrock, bucket, key):
+def categorize_image(bedrock, db, bucket, key, max_tokens):
     s3 = boto3.client('s3')
     response = s3.get_object(Bucket=bucket, Key=key)
     image_data = base64.b64encode(response['Body'].read()).decode('utf-8')
 
-    prompt = """
-    Categorize image strictly into ONE of these categories:
-    - exterior
-    - interior
-    - foods
-    - leisure
-    - parking
-    - rooms
-    - bathrooms
-
-    Return ONLY the category name (no quotes or explanations).
-    """
-
-    response = bedrock.invoke_model(
-        modelId="anthropic.claude-3-sonnet-20240229-v1:0",
-        body=json.dumps({
-            "anthropic_version": "bedrock-2023-05-31",
-            "messages": [{
-                "role": "user",
-                "content": [
-                    {"type": "image", "source": {"type": "base64", "media_type": "image/jpeg", "data": image_data}},
-                    {"type": "text", "text": prompt}
-                ]
-            }],
-            "max_tokens": 100
-        })
-    )
-
-    return json.loads(response['body'].read())['content'][0]['text'].strip()
\ No newline at end of file
+    response_body = invoke_claude(bedrock, db, STAGE, CATEGORY_PROMPT, "image/jpeg", image_data,
+                                  max_tokens, DEFAULT_MAX_TOKENS)
+    return response_body['content'][0]['text'].strip()
\ No newline at end of file
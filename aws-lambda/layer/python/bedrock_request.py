@@ -0,0 +1,136 @@
+"""
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import json
+from datetime import datetime
+
+MODEL_ID = "anthropic.claude-3-sonnet-20240229-v1:0"
+
+# Minimum cacheable prefix (tokens) for models with Bedrock prompt caching; other models get no cache point
+CACHE_MIN_TOKENS = {
+    "anthropic.claude-3-5-haiku-20241022-v1:0": 2048,
+    "anthropic.claude-3-7-sonnet-20250219-v1:0": 1024,
+    "anthropic.claude-sonnet-4-20250514-v1:0": 1024
+}
+
+# max_tokens tuning from recorded output lengths
+USAGE_SAMPLE_SIZE = 500
+MIN_USAGE_SAMPLES = 50
+MIN_MAX_TOKENS = 16
+
+
+def build_request_body(prompt, media_type, image_data, max_tokens, model_id=MODEL_ID):
+    """Build Claude request with the static prompt first (as a system block) and the image last"""
+    system_block = {"type": "text", "text": prompt}
+    if uses_cache_point(model_id, prompt):
+        system_block["cache_control"] = {"type": "ephemeral"}
+
+    return json.dumps({
+        "anthropic_version": "bedrock-2023-05-31",
+        "system": [system_block],
+        "messages": [{
+            "role": "user",
+            "content": [
+                {"type": "image", "source": {"type": "base64", "media_type": media_type, "data": image_data}}
+            ]
+        }],
+        "max_tokens": max_tokens
+    })
+
+
+def invoke_claude(bedrock, db, stage, prompt, media_type, image_data, max_tokens, default_max_tokens):
+    """Call Claude and record usage; retry once at the stage default if a tuned max_tokens cut the reply short"""
+    response = bedrock.invoke_model(
+        modelId=MODEL_ID,
+        body=build_request_body(prompt, media_type, image_data, max_tokens)
+    )
+    response_body = json.loads(response['body'].read())
+    record_usage(db, stage, response_body)
+
+    if response_body.get('stop_reason') == 'max_tokens':
+        if max_tokens >= default_max_tokens:
+            print(f"[{stage}] reply truncated at the default max_tokens={max_tokens}")
+            return response_body
+
+        # A truncated JSON reply cannot be parsed, so rerun with the untuned limit instead of losing the image
+        print(f"[{stage}] reply truncated at max_tokens={max_tokens}, retrying with {default_max_tokens}")
+        return invoke_claude(bedrock, db, stage, prompt, media_type, image_data,
+                             default_max_tokens, default_max_tokens)
+
+    return response_body
+
+
+def uses_cache_point(model_id, prompt):
+    """Mark the prompt for caching only if the model supports it and the prompt meets its minimum length"""
+    # Cross-region inference profiles prefix the model id (e.g. "us.anthropic..."); other providers never match
+    _, provider, model_name = model_id.partition("anthropic.")
+    if not provider:
+        return False
+    min_tokens = CACHE_MIN_TOKENS.get(provider + model_name)
+    return min_tokens is not None and estimate_tokens(prompt) >= min_tokens
+
+
+def estimate_tokens(text):
+    """Rough token count for English text (about 4 characters per token)"""
+    return len(text) // 4
+
+
+def record_usage(db, stage, response_body):
+    """Log and store token usage reported by Bedrock for a single call (best effort)"""
+    usage = response_body.get('usage', {})
+    input_tokens = usage.get('input_tokens', 0)
+    output_tokens = usage.get('output_tokens', 0)
+    cache_read_tokens = usage.get('cache_read_input_tokens', 0)
+    cache_write_tokens = usage.get('cache_creation_input_tokens', 0)
+
+    total_input = input_tokens + cache_read_tokens + cache_write_tokens
+    cached_share = cache_read_tokens / total_input if total_input else 0.0
+
+    print(f"[{stage}] input={total_input} output={output_tokens} "
+          f"cache_read={cache_read_tokens} cache_write={cache_write_tokens} cached_share={cached_share:.0%} "
+          f"stop_reason={response_body.get('stop_reason')}")
+
+    # Telemetry must never fail an analysis that Bedrock has already returned
+    try:
+        db.bedrock_usage.insert_one({
+            "stage": stage,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cache_read_input_tokens": cache_read_tokens,
+            "cache_creation_input_tokens": cache_write_tokens,
+            "stop_reason": response_body.get('stop_reason'),
+            "created_at": datetime.utcnow()
+        })
+    except Exception as e:
+        print(f"Failed to record usage for {stage}: {str(e)}")
+
+
+def get_max_tokens(db, stage, default):
+    """Size max_tokens from recent output lengths (p99 + 50% headroom), never above the default"""
+    try:
+        outputs = sorted(
+            doc['output_tokens'] for doc in db.bedrock_usage.find(
+                {"stage": stage}, {"_id": 0, "output_tokens": 1}
+            ).sort("_id", -1).limit(USAGE_SAMPLE_SIZE)
+        )
+    except Exception as e:
+        print(f"Failed to read usage for {stage}, using default max_tokens: {str(e)}")
+        return default
+
+    if len(outputs) < MIN_USAGE_SAMPLES:
+        return default
+
+    # Truncated calls report output_tokens == max_tokens, so the limit grows back after cutoffs
+    p99 = outputs[min(len(outputs) - 1, int(len(outputs) * 0.99))]
+    return min(default, max(MIN_MAX_TOKENS, int(p99 * 1.5)))
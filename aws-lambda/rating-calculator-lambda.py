@@ -17,6 +17,7 @@ import boto3
 import urllib.parse
 import base64
 from pymongo import MongoClient
+from bedrock_request import invoke_claude, get_max_tokens
 
 # Media type mapping
 IMAGE_EXTENSIONS = {
@@ -27,6 +28,20 @@ IMAGE_EXTENSIONS = {
     '.gif': 'image/gif'
 }
 
+# Stage name for usage tracking and its hand-set max_tokens ceiling
+STAGE = "rating"
+DEFAULT_MAX_TOKENS = 200
+
+# Static instructions, sent as the system block ahead of the image
+RATING_PROMPT = """Analyze this hotel image and provide a quality score (0-100) considering:
+1. Composition and framing (30%)
+2. Technical quality (25%)
+3. Aesthetic appeal (20%)
+4. Representative value (25%)
+
+Return ONLY JSON format:
+{"score": 75, "reason": "Well composed but slightly dark"}"""
+
 
 def lambda_handler(event, context):
     # Initialize clients
@@ -49,6 +64,8 @@ def lambda_handler(event, context):
             "body": json.dumps({"message": "No images found"})
         }
 
+    max_tokens = get_max_tokens(db, STAGE, DEFAULT_MAX_TOKENS)
+
     # Score each image and update ratings
     best_score = -1
     best_image = None
@@ -56,7 +73,7 @@ def lambda_handler(event, context):
     for img in images:
         try:
             # Rate the image (0-100)
-            rating = rate_image(bedrock, s3, img['image_url'])
+            rating = rate_image(bedrock, s3, db, img['image_url'], max_tokens)
 
             # Update rating in hotel_images table
             db.hotel_images.update_one(
@@ -102,43 +119,14 @@ def lambda_handler(event, context):
     }
 
 
-def rate_image(bedrock, s3, image_url):
+def rate_image(bedrock, s3, db, image_url, max_tokens):
     """Rate image quality using Claude 3 (0-100 scale)"""
     bucket, key = parse_s3_url(image_url)
     image_data = s3.get_object(Bucket=bucket, Key=key)['Body'].read()
 
-    prompt = """Analyze this hotel image and provide a quality score (0-100) considering:
-    1. Composition and framing (30%)
-    2. Technical quality (25%)
-    3. Aesthetic appeal (20%) 
-    4. Representative value (25%)
-
-    Return ONLY JSON format:
-    {"score": 75, "reason": "Well composed but slightly dark"}"""
-
-    response = bedrock.invoke_model(
-        modelId="anthropic.claude-3-sonnet-20240229-v1:0",
-        body=json.dumps({
-            "anthropic_version": "bedrock-2023-05-31",
-            "messages": [{
-                "role": "user",
-                "content": [
-                    {
-                        "type": "image",
-                        "source": {
-                            "type": "base64",
-                            "media_type": get_media_type(image_url),
-                            "data": base64.b64encode(image_data).decode('utf-8')
-                        }
-                    },
-                    {"type": "text", "text": prompt}
-                ]
-            }],
-            "max_tokens": 200
-        })
-    )
-
-    result = json.loads(response['body'].read())['content'][0]['text']
+    response_body = invoke_claude(bedrock, db, STAGE, RATING_PROMPT, get_media_type(image_url),
+                                  base64.b64encode(image_data).decode('utf-8'), max_tokens, DEFAULT_MAX_TOKENS)
+    result = response_body['content'][0]['text']
     return int(json.loads(result)['score'])
 
 
@@ -19,6 +19,19 @@ import base64
 from pymongo import MongoClient
 from bson import ObjectId
 from datetime import datetime
+from bedrock_request import invoke_claude, get_max_tokens
+
+# Stage name for usage tracking and its hand-set max_tokens ceiling
+STAGE = "room_type"
+DEFAULT_MAX_TOKENS = 300
+
+# Static instructions, sent as the system block ahead of the image
+ROOM_PROMPT = """Analyze this hotel room image and return JSON with:
+- "name": Creative name (max 3 words)
+- "type": Standardized from: single_room, double_room, twin_room, triple_room,
+           quad_room, studio_room, suite, junior_suite, executive_room,
+           presidential_suite, family_room, connecting_rooms, adjoining_rooms,
+           accessible_room, smoking_room, pet-friendly_room, themed_room"""
 
 # Media type mapping
 IMAGE_EXTENSIONS = {
@@ -41,6 +54,8 @@ def lambda_handler(event, context):
     hotel_id = sns_message['hotel_id']
     room_image_ids = sns_message['room_image_ids']
 
+    max_tokens = get_max_tokens(db, STAGE, DEFAULT_MAX_TOKENS)
+
     # Get existing rooms (for deduplication)
     existing_rooms = {
         (doc['room_id'], doc['room_type'].lower())
@@ -62,7 +77,7 @@ def lambda_handler(event, context):
         media_type = get_media_type(image_data['image_url'])
 
         try:
-            room_name, room_type = categorize_room(bedrock, image_data['image_url'], media_type)
+            room_name, room_type = categorize_room(bedrock, db, image_data['image_url'], media_type, max_tokens)
 
             # Try to extract room_id from S3 path (format: s3/hotels/rooms/r23/img.png)
             try:
@@ -104,7 +119,7 @@ def lambda_handler(event, context):
     )
 
 
-def categorize_room(bedrock, image_url, media_type):
+def categorize_room(bedrock, db, image_url, media_type, max_tokens):
     """Extract room name and type using Claude 3"""
     bucket, key = parse_s3_url(image_url)
 
@@ -112,36 +127,8 @@ def categorize_room(bedrock, image_url, media_type):
     s3 = boto3.client('s3')
     image_data = s3.get_object(Bucket=bucket, Key=key)['Body'].read()
 
-    prompt = """Analyze this hotel room image and return JSON with:
-    - "name": Creative name (max 3 words)
-    - "type": Standardized from: single_room, double_room, twin_room, triple_room, 
-               quad_room, studio_room, suite, junior_suite, executive_room, 
-               presidential_suite, family_room, connecting_rooms, adjoining_rooms, 
-               accessible_room, smoking_room, pet-friendly_room, themed_room"""
-
-    response = bedrock.invoke_model(
-        modelId="anthropic.claude-3-sonnet-20240229-v1:0",
-        body=json.dumps({
-            "anthropic_version": "bedrock-2023-05-31",
-            "messages": [{
-                "role": "user",
-                "content": [
-                    {
-                        "type": "image",
-                        "source": {
-                            "type": "base64",
-                            "media_type": media_type,
-                            "data": base64.b64encode(image_data).decode('utf-8')
-                        }
-                    },
-                    {"type": "text", "text": prompt}
-                ]
-            }],
-            "max_tokens": 300
-        })
-    )
-
-    response_body = json.loads(response['body'].read())
+    response_body = invoke_claude(bedrock, db, STAGE, ROOM_PROMPT, media_type,
+                                  base64.b64encode(image_data).decode('utf-8'), max_tokens, DEFAULT_MAX_TOKENS)
     claude_response = json.loads(response_body['content'][0]['text'])
     return claude_response['name'], claude_response['type']
 
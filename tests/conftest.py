@@ -0,0 +1,60 @@
+import importlib.util
+import io
+import json
+import os
+import sys
+
+import pytest
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'aws-lambda')
+
+# Shared Lambda layer code, importable as it is on the Lambda runtime
+sys.path.insert(0, os.path.join(LAMBDA_DIR, 'layer', 'python'))
+
+
+def import_lambda(name):
+    """Import aws-lambda/<name>-lambda.py (the hyphenated file names are not importable directly)"""
+    spec = importlib.util.spec_from_file_location(name.replace('-', '_'), os.path.join(LAMBDA_DIR, f'{name}-lambda.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class FakeAws:
+    """Offline stand-in for boto3: S3 returns image_bytes, Bedrock returns a canned reply, requests and SNS are recorded"""
+
+    def __init__(self, bedrock_text):
+        self.bedrock_text = bedrock_text
+        self.image_bytes = b'image-bytes'
+        self.stop_reasons = []  # Per-call stop_reason overrides, 'end_turn' once exhausted
+        self.requests = []
+        self.published = []
+
+    def client(self, name, **kwargs):
+        return self
+
+    def get_object(self, Bucket, Key):
+        return {'Body': io.BytesIO(self.image_bytes)}
+
+    def invoke_model(self, modelId, body):
+        self.requests.append(body)
+        return {'body': io.BytesIO(json.dumps({
+            'content': [{'type': 'text', 'text': self.bedrock_text}],
+            'stop_reason': self.stop_reasons.pop(0) if self.stop_reasons else 'end_turn',
+            'usage': {'input_tokens': 100, 'output_tokens': 10}
+        }).encode('utf-8'))}
+
+    def publish(self, TopicArn, Message):
+        self.published.append(json.loads(Message))
+
+
+@pytest.fixture
+def load_lambda():
+    """Loader for aws-lambda/<name>-lambda.py modules"""
+    return import_lambda
+
+
+@pytest.fixture
+def fake_aws():
+    """FakeAws factory: fake_aws(bedrock_text) builds an offline boto3 stand-in"""
+    return FakeAws
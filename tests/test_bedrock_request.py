@@ -0,0 +1,88 @@
+"""
+Offline checks for the shared Bedrock layer: when a cache point is added, that usage
+telemetry failures never reach the caller, and how truncated replies are retried.
+"""
+
+import json
+
+import bedrock_request
+
+CACHING_MODEL_ID = 'us.anthropic.claude-3-7-sonnet-20250219-v1:0'
+SHORT_PROMPT = 'Return ONLY the category name.'
+LONG_PROMPT = 'Describe the hotel image in detail.\n' * 200
+
+
+class FailingDb:
+    """db whose bedrock_usage collection raises on every call"""
+
+    def __init__(self):
+        self.bedrock_usage = self
+
+    def insert_one(self, doc):
+        raise RuntimeError('mongo down')
+
+    def find(self, *args, **kwargs):
+        raise RuntimeError('mongo down')
+
+
+class UsageDb:
+    """db whose bedrock_usage collection keeps inserted rows in memory"""
+
+    def __init__(self):
+        self.bedrock_usage = self
+        self.rows = []
+
+    def insert_one(self, doc):
+        self.rows.append(doc)
+
+
+def system_block(prompt, image, model_id):
+    return json.loads(bedrock_request.build_request_body(prompt, 'image/jpeg', image, 100, model_id))['system']
+
+
+def test_no_cache_point_on_unsupported_model():
+    assert 'cache_control' not in system_block(LONG_PROMPT, 'AAAA', bedrock_request.MODEL_ID)[0]
+
+
+def test_no_cache_point_below_minimum_prefix():
+    assert 'cache_control' not in system_block(SHORT_PROMPT, 'AAAA', CACHING_MODEL_ID)[0]
+
+
+def test_cache_point_is_stable_across_images_when_it_applies():
+    first, second = system_block(LONG_PROMPT, 'AAAA', CACHING_MODEL_ID), system_block(LONG_PROMPT, 'BBBB', CACHING_MODEL_ID)
+
+    assert first == second
+    assert first[-1]['cache_control'] == {'type': 'ephemeral'}
+
+
+def test_uses_cache_point_model_ids():
+    assert bedrock_request.uses_cache_point('anthropic.claude-3-7-sonnet-20250219-v1:0', LONG_PROMPT)
+    assert bedrock_request.uses_cache_point(CACHING_MODEL_ID, LONG_PROMPT)
+    assert not bedrock_request.uses_cache_point('amazon.nova-pro-v1:0', LONG_PROMPT)
+    assert not bedrock_request.uses_cache_point('0', LONG_PROMPT)
+
+
+def test_usage_telemetry_failures_are_not_raised():
+    bedrock_request.record_usage(FailingDb(), 'rating', {'usage': {'input_tokens': 10, 'output_tokens': 2}})
+
+    assert bedrock_request.get_max_tokens(FailingDb(), 'rating', 200) == 200
+
+
+def test_truncated_reply_is_retried_at_the_default(fake_aws):
+    aws = fake_aws('{"score": 80}')
+    aws.stop_reasons = ['max_tokens']
+
+    body = bedrock_request.invoke_claude(aws, UsageDb(), 'rating', SHORT_PROMPT, 'image/jpeg', 'AAAA', 40, 200)
+
+    assert body['stop_reason'] == 'end_turn'
+    assert [json.loads(request)['max_tokens'] for request in aws.requests] == [40, 200]
+
+
+def test_truncation_at_the_default_is_not_retried(fake_aws):
+    aws = fake_aws('{"score": 80')
+    aws.stop_reasons = ['max_tokens']
+
+    body = bedrock_request.invoke_claude(aws, UsageDb(), 'rating', SHORT_PROMPT, 'image/jpeg', 'AAAA', 200, 200)
+
+    assert body['stop_reason'] == 'max_tokens'
+    assert len(aws.requests) == 1
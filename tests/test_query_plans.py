@@ -0,0 +1,123 @@
+"""
+Runs the whole pipeline against a disposable MongoDB and asserts that no query the
+processors send plans a COLLSCAN once the bootstrap indexes exist.
+
+Set MONGODB_URI to point at a throwaway server. When it is set the tests fail if the server
+is unreachable; without it they try localhost and skip when nothing answers there.
+"""
+
+import json
+import os
+import uuid
+
+import pytest
+
+pymongo = pytest.importorskip('pymongo')
+from pymongo import monitoring
+
+HOTEL_ID = 'h1'
+BUCKET = 'hotel-images'
+ROOM_KEY = f'hotels/{HOTEL_ID}/r1/room.jpg'
+
+# Processors in pipeline order with the canned Bedrock reply each one expects
+PIPELINE = [
+    ('hotel-processor', 'rooms'),
+    ('room-processor', '{"name": "Ocean View", "type": "suite"}'),
+    ('amenity-processor', 'free-wi-fi,swimming-pool'),
+    ('rating-calculator', '{"score": 80, "reason": "Well lit"}')
+]
+
+
+class QueryRecorder(monitoring.CommandListener):
+    """Collect (collection, filter) for every find/update/delete the processors send"""
+
+    def __init__(self):
+        self.queries = []
+
+    def started(self, event):
+        command = event.command
+        if event.command_name == 'find':
+            self.queries.append((command['find'], command.get('filter', {})))
+        elif event.command_name == 'update':
+            self.queries.extend((command['update'], u['q']) for u in command.get('updates', []))
+        elif event.command_name == 'delete':
+            self.queries.extend((command['delete'], d['q']) for d in command.get('deletes', []))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+class RoutingClient:
+    """Replaces MongoClient inside a Lambda so every database name maps to the disposable one"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def __call__(self, *args, **kwargs):
+        return self
+
+    def __getitem__(self, name):
+        return self.db
+
+
+@pytest.fixture
+def mongo():
+    explicit_uri = os.environ.get('MONGODB_URI')
+    uri = explicit_uri or 'mongodb://localhost:27017/'
+    recorder = QueryRecorder()
+    client = pymongo.MongoClient(uri, serverSelectionTimeoutMS=2000, event_listeners=[recorder])
+    try:
+        client.admin.command('ping')
+    except pymongo.errors.PyMongoError as e:
+        # A configured server that cannot be reached is an error, not a reason to skip the plan checks
+        if explicit_uri:
+            pytest.fail(f'MONGODB_URI is set but {uri} is unreachable: {e}')
+        pytest.skip(f'No MongoDB reachable at {uri} (set MONGODB_URI to require these tests)')
+
+    db_name = f'hotel_db_test_{uuid.uuid4().hex[:8]}'
+    yield client[db_name], recorder
+    client.drop_database(db_name)
+    client.close()
+
+
+def run_pipeline(db, monkeypatch, load_lambda, fake_aws):
+    """Run each processor in order, feeding it the event the previous stage would publish"""
+    event = {'Records': [{'s3': {'bucket': {'name': BUCKET}, 'object': {'key': ROOM_KEY}}}]}
+
+    for name, bedrock_text in PIPELINE:
+        module = load_lambda(name)
+        aws = fake_aws(bedrock_text)
+        monkeypatch.setattr(module, 'boto3', aws)
+        monkeypatch.setattr(module, 'MongoClient', RoutingClient(db))
+
+        module.lambda_handler(event, None)
+
+        message = aws.published[-1] if aws.published else {'hotel_id': HOTEL_ID}
+        event = {'Records': [{'Sns': {'Message': json.dumps(message)}}]}
+
+
+def test_pipeline_queries_use_indexes(mongo, monkeypatch, load_lambda, fake_aws):
+    db, recorder = mongo
+    bootstrap = load_lambda('db-bootstrap')
+    bootstrap.apply_image_schema(db)
+    bootstrap.ensure_indexes(db)
+
+    recorder.queries.clear()
+    run_pipeline(db, monkeypatch, load_lambda, fake_aws)
+    assert recorder.queries, 'pipeline sent no queries'
+
+    for collection, query in recorder.queries:
+        plan = db[collection].find(query).explain()['queryPlanner']['winningPlan']
+        assert 'COLLSCAN' not in bootstrap.collect_stages(plan), f'{collection} {query} plans a COLLSCAN'
+
+
+def test_bootstrap_query_list_uses_indexes(mongo, load_lambda):
+    db, _ = mongo
+    bootstrap = load_lambda('db-bootstrap')
+    bootstrap.apply_image_schema(db)
+    bootstrap.ensure_indexes(db)
+
+    bootstrap.verify_query_plans(db)
@@ -0,0 +1,95 @@
+"""
+Offline checks that each Lambda's Bedrock call path sends byte-stable request bodies:
+repeated calls send identical bytes, and everything before the image is identical
+across different images, with the image as the last user content.
+"""
+
+import base64
+import json
+
+import pytest
+
+pytest.importorskip('boto3')
+pytest.importorskip('pymongo')
+
+IMAGE_URL = 'https://hotel-images.s3.amazonaws.com/hotels/h1/r1/room.jpg'
+IMAGE_A = b'first-image'
+IMAGE_B = b'second-image'
+
+
+class UsageDb:
+    """Minimal db with a bedrock_usage collection that keeps inserted rows in memory"""
+
+    def __init__(self):
+        self.bedrock_usage = self
+        self.rows = []
+
+    def insert_one(self, doc):
+        self.rows.append(doc)
+
+
+def categorize_image(module, aws, db):
+    return module.categorize_image(aws, db, 'hotel-images', 'hotels/h1/lobby.jpg', module.DEFAULT_MAX_TOKENS)
+
+
+def categorize_room(module, aws, db):
+    return module.categorize_room(aws, db, IMAGE_URL, 'image/jpeg', module.DEFAULT_MAX_TOKENS)
+
+
+def get_amenities_from_bedrock(module, aws, db):
+    encoded_image = base64.b64encode(aws.image_bytes).decode('utf-8')
+    return module.get_amenities_from_bedrock(aws, db, encoded_image, 'image/jpeg', module.DEFAULT_MAX_TOKENS)
+
+
+def rate_image(module, aws, db):
+    return module.rate_image(aws, aws, db, IMAGE_URL, module.DEFAULT_MAX_TOKENS)
+
+
+# Lambda name -> (Bedrock call path, canned reply it parses)
+CALL_PATHS = {
+    'hotel-processor': (categorize_image, 'rooms'),
+    'room-processor': (categorize_room, '{"name": "Ocean View", "type": "suite"}'),
+    'amenity-processor': (get_amenities_from_bedrock, 'free-wi-fi,swimming-pool'),
+    'rating-calculator': (rate_image, '{"score": 80, "reason": "Well lit"}')
+}
+
+
+@pytest.fixture(params=sorted(CALL_PATHS))
+def send_twice(request, load_lambda, fake_aws, monkeypatch):
+    """Run a Lambda's real Bedrock call path once per image and return the recorded request bodies"""
+    module = load_lambda(request.param)
+    call, reply = CALL_PATHS[request.param]
+    aws = fake_aws(reply)
+    monkeypatch.setattr(module, 'boto3', aws)
+
+    def send(first_image, second_image):
+        for image in (first_image, second_image):
+            aws.image_bytes = image
+            call(module, aws, UsageDb())
+        return aws.requests[-2:]
+
+    return send
+
+
+def image_offset(body, image):
+    return body.index(base64.b64encode(image).decode('utf-8'))
+
+
+def test_repeated_calls_send_identical_bytes(send_twice):
+    first, second = send_twice(IMAGE_A, IMAGE_A)
+    assert first == second
+
+
+def test_prefix_before_image_is_identical_across_images(send_twice):
+    body_a, body_b = send_twice(IMAGE_A, IMAGE_B)
+
+    assert body_a[:image_offset(body_a, IMAGE_A)] == body_b[:image_offset(body_b, IMAGE_B)]
+    assert json.loads(body_a)['system'] == json.loads(body_b)['system']
+
+
+def test_image_is_last_user_content(send_twice):
+    body_a, _ = send_twice(IMAGE_A, IMAGE_B)
+    content = json.loads(body_a)['messages'][-1]['content']
+
+    assert content[-1]['type'] == 'image'
+    assert content[-1]['source']['data'] == base64.b64encode(IMAGE_A).decode('utf-8')